@@ -1,14 +1,108 @@
+import os
 import streamlit as st
-import rasterio
 import numpy as np
-import geopandas as gpd
-from shapely.geometry import Point
-import folium
-from folium.plugins import HeatMap
 
 # Configure default page settings
 st.set_page_config(page_title="LST Hotspot Analyzer", layout="wide")
 
+# Lowest value offered by the upper percentile slider
+MIN_PERCENTILE = 95
+# Initial map zoom; also sets the resolution hotspots are drawn at
+MAP_ZOOM = 11
+
+def xy_vec(transform, rows, cols):
+    # Vectorized rasterio.transform.xy (pixel centers) for whole index arrays
+    a, b, c = transform.a, transform.b, transform.c
+    d, e, f = transform.d, transform.e, transform.f
+    r = rows + 0.5
+    k = cols + 0.5
+    return a * k + b * r + c, d * k + e * r + f
+
+def display_factor(transform, zoom):
+    # Raster pixels per screen pixel at this zoom level; no point drawing
+    # hotspots finer than the map can show
+    screen_res = 360 / (256 * 2 ** zoom)
+    return max(1, int(screen_res / abs(transform.a)))
+
+def block_reduce(arr, factor, ufunc, fill):
+    # Pad to whole factor x factor blocks and reduce each block with ufunc
+    h, w = -(-arr.shape[0] // factor), -(-arr.shape[1] // factor)
+    padded = np.full((h * factor, w * factor), fill, dtype=arr.dtype)
+    padded[:arr.shape[0], :arr.shape[1]] = arr
+    blocks = padded.reshape(h, factor, w, factor)
+    return ufunc.reduce(ufunc.reduce(blocks, axis=3), axis=1)
+
+@st.cache_resource(show_spinner=False)
+def load_raster(path, mtime):
+    # Held as a shared resource so reruns reuse the arrays instead of
+    # unpickling a fresh copy; mtime in the key re-reads an updated GeoTIFF
+    import rasterio
+
+    with rasterio.open(path) as src:
+        # float32 is ample precision for threshold detection on normalized LST
+        band = src.read(1, out_dtype=np.float32)
+        transform = src.transform
+        nodata = src.nodata or -9999
+
+    # Track nodata with a boolean mask instead of writing NaNs into the band
+    valid_mask = ~np.isnan(band)
+    valid_mask &= band != nodata
+    # Shared across sessions, so guard against in-place edits
+    band.flags.writeable = False
+    valid_mask.flags.writeable = False
+    return band, transform, valid_mask
+
+@st.cache_data(show_spinner=False)
+def sorted_tail(path, mtime, min_percentile):
+    # Only values above the slider's lowest percentile can become the threshold,
+    # so partition off that upper tail and sort just the tail
+    band, _, valid_mask = load_raster(path, mtime)
+    valid_vals = band[valid_mask]
+    k = int(min_percentile / 100 * (valid_vals.size - 1))
+    valid_vals.partition(k)
+    tail = valid_vals[k:].copy()
+    tail.sort()
+    return tail, valid_vals.size
+
+def tail_percentile(tail, n_valid, percentile):
+    # Rank within all valid values, offset into the cached upper tail
+    k = int(percentile / 100 * (n_valid - 1))
+    return tail[k - (n_valid - tail.size)]
+
+@st.cache_data(show_spinner=False)
+def compute_hotspots(path, mtime, upper_percentile, max_hotspots):
+    # Depends only on the analysis inputs, so map styling changes skip it
+    band, transform, valid_mask = load_raster(path, mtime)
+
+    # Statistical analysis, at native resolution so the threshold and the
+    # hotspot count refer to Landsat pixels
+    tail, n_valid = sorted_tail(path, mtime, MIN_PERCENTILE)
+    threshold = tail_percentile(tail, n_valid, upper_percentile)
+    hot = valid_mask & (band > threshold)
+    n_hotspots = np.count_nonzero(hot)
+
+    # Draw at screen resolution: one cell per block of raster pixels,
+    # keeping the block's peak hotspot value and how many pixels are hot
+    factor = display_factor(transform, MAP_ZOOM)
+    cell_max = block_reduce(np.where(hot, band, np.nan), factor, np.fmax, np.nan)
+    cell_hot = block_reduce(hot, factor, np.add, False)
+    cell_transform = transform * transform.scale(factor, factor)
+
+    # Coordinate conversion with type safety
+    rows, cols = np.nonzero(~np.isnan(cell_max))
+    n_cells = rows.size
+    if n_cells > max_hotspots:
+        # Keep the hottest cells; the heatmap blurs the rest together anyway
+        top = np.argpartition(cell_max[rows, cols], -max_hotspots)[-max_hotspots:]
+        rows, cols = rows[top], cols[top]
+    xs, ys = xy_vec(cell_transform, rows, cols)
+    # Weight each cell by the share of its pixels that are hotspots
+    weights = cell_hot[rows, cols] / factor ** 2
+
+    heat_data = np.column_stack([np.round(ys, 6), np.round(xs, 6), weights])
+    coverage = n_valid / band.size
+    return heat_data, float(threshold), n_hotspots, n_cells, coverage
+
 def main():
     st.title("🌡️ Potential Sites Contributing to Air Pollution in Erbil City in January 2025 (Not Yet Verified)")
     
@@ -31,10 +125,12 @@ def analyzer_tab():
         st.header("Analysis Parameters")
         upper_percentile = st.slider(
             "Upper Percentile Limit (%)", 
-            95, 100, 97, 1,
+            MIN_PERCENTILE, 100, 97, 1,
             help="Adjust the limit for detecting extreme values as hotspots. \
                   Lower values highlight more extreme hotspots."
         )
+        max_hotspots = st.slider("Max Hotspot Cells Drawn", 5000, 50000, 40000, 5000,
+                                 help="Only the hottest map cells up to this count are drawn")
         heat_radius = st.slider("Heatmap Radius", 5, 10, 7,
                                help="Visualization intensity radius")
         color_scheme = st.selectbox("Color Scheme", 
@@ -58,39 +154,28 @@ def analyzer_tab():
 
     try:
         # Data processing pipeline
-        with rasterio.open(FILE_PATH) as src:
-            band = src.read(1)
-            transform = src.transform
-            nodata = src.nodata or -9999
-            
-            # Convert to float32 for better memory handling
-            data = band.astype(np.float32)
-            data[data == nodata] = np.nan
-
-        # Statistical analysis
-        valid_vals = data[~np.isnan(data)]
-        threshold = np.percentile(valid_vals, upper_percentile)
-
-        # Coordinate conversion with type safety
-        hotspots = []
-        rows, cols = np.where(data > threshold)
-        for r, c in zip(rows.astype(int), cols.astype(int)):
-            lon, lat = rasterio.transform.xy(transform, r, c)
-            hotspots.append([float(np.round(lat, 6)), float(np.round(lon, 6))])
-
-        # Visualization
+        mtime = os.path.getmtime(FILE_PATH)
+        heat_data, threshold, n_hotspots, n_cells, coverage = compute_hotspots(
+            FILE_PATH, mtime, upper_percentile, max_hotspots)
+
+        # Visualization; imported here so the page shell renders before
+        # folium and streamlit-folium load
+        import folium
+        from folium.plugins import HeatMap
+        from streamlit_folium import st_folium
+
         m = folium.Map(
             location=[36.2, 43.9],
-            zoom_start=11,
+            zoom_start=MAP_ZOOM,
             tiles="https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}",
             attr="Google Satellite",
             control_scale=True
         )
 
-        if hotspots:
+        if heat_data.size:
             HeatMap(
                 name="Thermal Hotspots",
-                data=hotspots,
+                data=heat_data.tolist(),
                 radius=heat_radius,
                 gradient=GRADIENTS[color_scheme],
                 min_opacity=0.3,
@@ -105,14 +190,25 @@ def analyzer_tab():
         with col1:
             st.metric("Upper Threshold Value", f"{threshold:.2f}°C")
         with col2:
-            st.metric("Identified Hotspots", f"{len(hotspots):,}")
+            st.metric("Identified Hotspots", f"{n_hotspots:,}")
         with col3:
             st.metric("Data Coverage", 
-                     f"{(valid_vals.size/data.size)*100:.1f}%")
+                     f"{coverage*100:.1f}%")
 
         # Map display
         with st.expander("Interactive Thermal Map", expanded=True):
-            st.components.v1.html(m._repr_html_(), height=650)
+            if len(heat_data) < n_cells:
+                st.caption(f"Showing the hottest {len(heat_data):,} of {n_cells:,} hotspot "
+                           "cells; raise the cell limit in the sidebar to draw all of them")
+            st_folium(m, height=650, use_container_width=True, returned_objects=[])
+
+    except ImportError as e:
+        # Deferred imports fail here; don't report them as data-file problems
+        st.error(f"""
+        🚨 Missing Dependency: {str(e)}
+        - Install the packages listed in requirements.txt
+        """)
+        st.stop()
 
     except Exception as e:
         st.error(f"""